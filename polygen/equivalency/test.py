@@ -1,6 +1,9 @@
 import os
+import ast
+import atexit
 import unittest
 import logging
+import functools
 
 from pathlib import Path
 from tempfile import TemporaryDirectory
@@ -59,17 +62,24 @@ TEST_CASE_DIRS = sorted(
     # reverse=True
 )
 
-# Set `POLYGEN_TEST_DIR` environment variable to an existing directory
-# to save the results for inspection. If variable is not set,
-# TemporaryDirectory is used.
 TEST_NAME = "test_equivalency"
-TMP_DIR = None
-TEST_DIR = os.environ.get("POLYGEN_TEST_DIR")
-if TEST_DIR:
-    TEST_DIR = Path(TEST_DIR) / TEST_NAME
-else:
-    TMP_DIR = TemporaryDirectory()
-    TEST_DIR = Path(TMP_DIR.name) / TEST_NAME
+
+
+@functools.cache
+def get_test_dir() -> Path:
+    """Resolve the directory for generated parsers and test files.
+
+    Set `POLYGEN_TEST_DIR` environment variable to an existing directory
+    to save the results for inspection. If variable is not set,
+    TemporaryDirectory is created on the first call and removed at exit.
+    """
+    test_dir = os.environ.get("POLYGEN_TEST_DIR")
+    if test_dir:
+        return Path(test_dir) / TEST_NAME
+
+    tmp_dir = TemporaryDirectory()
+    atexit.register(tmp_dir.cleanup)
+    return Path(tmp_dir.name) / TEST_NAME
 
 
 # Match unittest naming style
@@ -83,11 +93,14 @@ def setUpUnittestSuite(backend_name: Optional[str]):
     suite = unittest.TestSuite()
 
     for _backend in backends(backend_name):
+        # Dependencies do not change between test cases
+        _backend.runner.find_deps()
+
         gen = _backend.generator
         backend_full_name = normalize_str(
             f"{gen.NAME}_{gen.LANGUAGE}_{gen.VERSION}")
 
-        backend_output_dir = TEST_DIR / backend_full_name
+        backend_output_dir = get_test_dir() / backend_full_name
         backend_output_dir.mkdir(parents=True, exist_ok=True)
 
         for tc in TEST_CASE_DIRS:
@@ -100,31 +113,37 @@ def setUpUnittestSuite(backend_name: Optional[str]):
                 backend = _backend
                 output_directory = test_output_directory
 
-                def setUp(self):
-                    self.output_directory.mkdir(exist_ok=True)
-                    grammar = self.test_case / GRAMMAR_FILE_NAME
+                # The parser is generated once for all inputs of the case
+                @classmethod
+                def setUpClass(cls):
+                    cls.output_directory.mkdir(exist_ok=True)
+                    grammar = cls.test_case / GRAMMAR_FILE_NAME
                     generate_parser(grammar_file=grammar,
-                                    backend=self.backend,
-                                    output_directory=self.output_directory)
-                    self.backend.runner.find_deps()
-                    self.backend.runner.setup()
+                                    backend=cls.backend,
+                                    output_directory=cls.output_directory)
+                    cls.backend.runner.setup()
 
-                    skip_file = self.test_case / SKIP_FILE_NAME
+                    skip_file = cls.test_case / SKIP_FILE_NAME
                     skip = None
                     if skip_file.exists():
                         skip = get_data(skip_file)
-                    self.skip = skip
+                    cls.skip = skip
+
+                @classmethod
+                def tearDownClass(cls):
+                    cls.backend.runner.setdown()
 
-                def tearDown(self):
-                    self.backend.runner.setdown()
+            # List the directory once and sort out the inputs by suffix
+            success_input_files, failure_input_files = [], []
+            for input_file in sorted(tc.iterdir()):
+                if input_file.name.endswith(SUCCESS_FILE_STEM):
+                    success_input_files.append(input_file)
+                elif input_file.name.endswith(FAILURE_FILE_STEM):
+                    failure_input_files.append(input_file)
 
-            pattern = f"*{SUCCESS_FILE_STEM}"
-            success_input_files = sorted(tc.glob(pattern))
             for input_file in success_input_files:
                 addSuccessCase(TestCase, input_file, tc_full_name)
 
-            pattern = f"*{FAILURE_FILE_STEM}"
-            failure_input_files = sorted(tc.glob(pattern))
             for input_file in failure_input_files:
                 addFailureCase(TestCase, input_file, tc_full_name)
 
@@ -201,10 +220,28 @@ def backends(backend_name: Optional[str] = None) -> Iterator[Backend]:
             yield init_backend(file, [])
 
 
-def evaluate(data):
-    # do not supply builtin functions, because these files are intended
+def evaluate(data: str):
+    # only literals and tokens are allowed, because these files are intended
     # to be just a result without any calculations or side-effects
-    return eval(data, {"__builtins__": {}, "Token": Token})
+    return _evaluate(ast.parse(data.strip(), mode="eval").body)
+
+
+def _evaluate(node: ast.expr):
+    if isinstance(node, ast.Call):
+        func = node.func
+        if (isinstance(func, ast.Name) and func.id == "Token"
+                and not node.keywords):
+            return Token(*(_evaluate(arg) for arg in node.args))
+    elif isinstance(node, ast.List):
+        return [_evaluate(e) for e in node.elts]
+    elif isinstance(node, ast.Tuple):
+        return tuple(_evaluate(e) for e in node.elts)
+    elif isinstance(node, ast.Dict) and None not in node.keys:
+        return {_evaluate(k): _evaluate(v)
+                for k, v in zip(node.keys, node.values)}
+
+    # raises ValueError on anything that is not a literal
+    return ast.literal_eval(node)
 
 
 def get_data(clue_file):
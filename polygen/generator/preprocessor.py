@@ -13,6 +13,7 @@ DIRECTIVE_RE = re.compile(r"(?<!\\)%% *(\w+) *%%")
 DIRECTIVE_LINE_RE = re.compile(fr"(.*){DIRECTIVE_RE.pattern}(.*)\Z",
                                re.DOTALL)
 NEWLINE_RE = re.compile(r"\A\n\r?\Z")
+INPUT_SUFFIX_RE = re.compile(r"\.in(put)?$")
 
 
 class PreprocessorDirective(NamedTuple):
@@ -125,7 +126,7 @@ def create_output_filename(input_file: Path | str, add_stem=True) -> str:
     """Replace `.in` and `.input` by `.out` and return new string."""
     name = str(input_file)
     stem = r".out" if add_stem else ""
-    return re.sub(r"\.in(put)?$", stem, name)
+    return INPUT_SUFFIX_RE.sub(stem, name)
 
 
 def process_file(directives: dict[str, str | TextIOBase],
@@ -3,7 +3,14 @@ from __future__ import annotations
 import logging
 
 from collections import defaultdict, Counter
-from typing import Iterator, TypeVar, Hashable, OrderedDict, Optional
+from typing import (
+    Iterable,
+    Iterator,
+    TypeVar,
+    Hashable,
+    OrderedDict,
+    Optional
+)
 
 from .node import (
     GrammarVisitor,
@@ -100,9 +107,15 @@ class ModifierVisitor:
     def __init__(self, modifiers):
         self.modifiers = modifiers
         self.warnings = []
+        # Visitor methods of the current modifier by node type
+        self._visitors = {}
+        # Node types whose children the current modifier does not visit
+        self._skip_types = frozenset()
 
     def apply(self, tree: Grammar):
         for m in self.modifiers:
+            self._visitors = {}
+            self._skip_types = frozenset(getattr(m, "skip_types", ()))
             while not m.done:
                 self._visit(tree, Context(), m)
                 m.apply()
@@ -113,16 +126,22 @@ class ModifierVisitor:
     def _visit(self, node, parents, modifier):
         if modifier.done:
             return
-        parents.append(node)
-        for child in node:
-            self._visit(child, parents, modifier)
-        parents.pop()
+        if type(node) not in self._skip_types:
+            parents.append(node)
+            for child in node:
+                self._visit(child, parents, modifier)
+            parents.pop()
         self._visit_post(node, parents, modifier)
 
     def _visit_post(self, node, parents, modifier):
-        node_type_name = type(node).__name__
-        method_name = f"visit_{node_type_name}"
-        visitor = getattr(modifier, method_name, None)
+        node_type = type(node)
+        try:
+            visitor = self._visitors[node_type]
+        except KeyError:
+            method_name = f"visit_{node_type.__name__}"
+            visitor = getattr(modifier, method_name, None)
+            self._visitors[node_type] = visitor
+
         if visitor is not None:
             try:
                 visitor(node, parents)
@@ -309,6 +328,9 @@ class RangeRepError(SemanticError):
 class CheckUndefinedRules:
     """Finds rules, that are referenced but not found in the grammar."""
 
+    # Terminals cannot contain rule references
+    skip_types = (String, Class, Range)
+
     def __init__(self, options: Options):
         self.named_items: defaultdict[list[Rule]] = defaultdict(list)
         self.rule_names: set[Id] = set()
@@ -333,6 +355,8 @@ class CheckUndefinedRules:
 class CheckRedefinedRules:
     """Finds rules that are defined more than once."""
 
+    skip_types = (Rule,)
+
     def __init__(self, options: Options):
         self.rules = defaultdict(list)
         self.options = options
@@ -416,24 +440,27 @@ class ReplaceNestedExprs:
 class FindEntryRule:
     """Tries to find the rule marked as `@entry`."""
 
+    # Only the top-level rule list is inspected
+    skip_types = (Grammar,)
+
     def __init__(self, options: Options):
         self.entry: Rule | None = None
         self.options = options
         self.done = False
 
     def visit_Grammar(self, node: Grammar, parents):
+        for rule in DLL.forward(node.rules):
+            if not rule.entry:
+                continue
+
+            if self.entry is not None:
+                raise RedefEntryError(self.entry, rule)
+            self.entry = rule
+
         if self.entry is None:
             raise UndefEntryError
         node.entry = self.entry
 
-    def visit_Rule(self, node: Rule, parents):
-        if not node.entry:
-            return
-
-        if self.entry is not None:
-            raise RedefEntryError(self.entry, node)
-        self.entry = node
-
     def apply(self):
         self.done = True
 
@@ -452,13 +479,13 @@ class CreateAnyChar:
 
     def __init__(self, options: Options, strict=False):
         self.strict = strict
-        self.chars: set[Char] = set()
+        self.codes: set[int] = set()
         self.rule_id = Id("AnyChar__GEN")
         self.options = options
         self.done = False
 
     def visit_Char(self, node: Char, parents):
-        self.chars.add(node)
+        self.codes.add(node.code)
 
     def visit_AnyChar(self, node: AnyChar, parents):
         assert parents[-1] is not None
@@ -467,7 +494,7 @@ class CreateAnyChar:
 
     def visit_Grammar(self, node: Grammar, parents):
         if self.strict:
-            cls = charset_to_class(self.chars)
+            cls = charset_to_class(self.codes)
 
             logger.info("AnyChar class: %s", cls)
 
@@ -673,31 +700,34 @@ class ValidateRangesAndReps:
         self.done = True
 
 
-def charset_to_class(chars: set[Char]) -> Class:
-    """Create class of ranges from the set of characters."""
-    ranges = []
-    lst = []
-    for c in sorted(chars):
-        if not lst or c.code - lst[-1].code == 1:
-            lst.append(c)
-        else:
-            if len(lst) == 1:
-                beg, end = lst[0], None
-            else:
-                beg, end = lst[0], lst[-1]
-            ranges.append(Range(beg, end))
-            lst.clear()
+def charset_to_class(codes: Iterable[int]) -> Class:
+    """Create class of ranges from the set of character codes.
 
-    if lst:
-        if len(lst) == 1:
-            beg, end = lst[0], None
-        else:
-            beg, end = lst[0], lst[-1]
-        ranges.append(Range(beg, end))
+    Consecutive codes are merged into a single range. New `Char` nodes
+    are created, so the nodes of the grammar are not shared.
+    """
+    ranges = []
+    it = iter(sorted(set(codes)))
+    first = last = next(it, None)
+    if first is None:
+        return Class(ranges)
+
+    for code in it:
+        if code != last + 1:
+            ranges.append(_make_range(first, last))
+            first = code
+        last = code
+    ranges.append(_make_range(first, last))
 
     return Class(ranges)
 
 
+def _make_range(first: int, last: int) -> Range:
+    if first == last:
+        return Range(Char(first))
+    return Range(Char(first), Char(last))
+
+
 class NullableVisitor(GrammarVisitor):
     def __init__(self, grammar: Grammar):
         self.grammar = grammar
@@ -705,12 +735,15 @@ class NullableVisitor(GrammarVisitor):
         self.nullables: set[Id] = set()
 
     def visit_Grammar(self, node: Grammar):
-        for r in node:
-            self.visit(r)
-
-        self.visited.clear()
-        for r in node:
-            self.visit(r)
+        # A rule may refer to the rules defined after it, so iterate until
+        # no new nullable rules are found.
+        while True:
+            count = len(self.nullables)
+            self.visited.clear()
+            for r in node:
+                self.visit(r)
+            if len(self.nullables) == count:
+                break
 
     def visit_Rule(self, node: Rule) -> bool:
         if node.id in self.visited:
@@ -1,6 +1,16 @@
 from __future__ import annotations
 
-from typing import Iterable, Optional, TypeVar, Union, Iterator, Any
+from typing import (
+    Iterable,
+    Optional,
+    TypeVar,
+    Union,
+    Iterator,
+    Any,
+    Callable
+)
+from copy import deepcopy
+from functools import cache
 from itertools import zip_longest
 
 from .utility import code_to_char, wrap_string
@@ -12,8 +22,40 @@ DoublyLinked = TypeVar("DoublyLinked", bound="DLL")
 class DLL:
     """Doubly linked list"""
 
-    left: Optional[DoublyLinked] = None
-    right: Optional[DoublyLinked] = None
+    __slots__ = ("left", "right")
+
+    left: Optional[DoublyLinked]
+    right: Optional[DoublyLinked]
+
+    def __init__(self):
+        self.left = None
+        self.right = None
+
+    def __deepcopy__(self, memo: dict):
+        # Following the links recursively would make the copy as deep as
+        # the list is long, so the whole list is copied in a loop. All the
+        # nodes are registered in `memo` before their contents are copied,
+        # so that references into the list resolve to the new nodes.
+        nodes = list(DLL.forward(self.begin))
+        copies = []
+        for node in nodes:
+            new = object.__new__(type(node))
+            new.left = copies[-1] if copies else None
+            new.right = None
+            if copies:
+                copies[-1].right = new
+            memo[id(node)] = new
+            copies.append(new)
+
+        for node, new in zip(nodes, copies):
+            for name in _data_slots(type(node)):
+                try:
+                    value = getattr(node, name)
+                except AttributeError:
+                    continue
+                setattr(new, name, deepcopy(value, memo))
+
+        return memo[id(self)]
 
     @classmethod
     def from_iterable(cls, it: Iterable[DoublyLinked]) -> DoublyLinked | None:
@@ -145,15 +187,40 @@ class DLL:
         return tuple(DLL.forward(self))
 
 
+@cache
+def _data_slots(cls: type) -> tuple[str, ...]:
+    """Names of the slots of a DLL node class, except the links."""
+    names = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get("__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        names.extend(slots)
+    return tuple(n for n in names if n not in ("left", "right"))
+
+
 class GrammarVisitor:
     # taken from pegen
     # https://github.com/we-like-parsers/pegen/blob/main/src/pegen/grammar.py
 
+    # Visitor functions by node type, one table per class
+    _visitors: dict[type, Callable] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._visitors = {}
+
     def visit(self, node, *args: Any, **kwargs: Any) -> Any:
         """Visit a node."""
-        method = f"visit_{type(node).__name__}"
-        visitor = getattr(self, method, self.generic_visit)
-        return visitor(node, *args, **kwargs)
+        node_type = type(node)
+        try:
+            visitor = self._visitors[node_type]
+        except KeyError:
+            cls = type(self)
+            method = f"visit_{node_type.__name__}"
+            visitor = getattr(cls, method, cls.generic_visit)
+            self._visitors[node_type] = visitor
+        return visitor(self, node, *args, **kwargs)
 
     def generic_visit(self, node, *args: Any, **kwargs: Any) -> None:
         for value in node:
@@ -161,6 +228,8 @@ class GrammarVisitor:
 
 
 class ParseInfo:
+    __slots__ = ("start", "end", "line", "filename")
+
     start: int
     end: int
     line: int
@@ -188,6 +257,8 @@ class RuleNotFound(GrammarError):
 
 
 class Grammar:
+    __slots__ = ("rules", "metarules", "directives", "entry", "parse_info")
+
     def __init__(self,
                  rules: Iterable[Rule],
                  metarules: Optional[Iterable[MetaRule]] = None,
@@ -275,7 +346,10 @@ class Grammar:
 
 
 class Directive(DLL):
+    __slots__ = ("line", "filename")
+
     def __init__(self, line: int, filename: str):
+        super().__init__()
         self.line = line
         self.filename = filename
 
@@ -284,6 +358,8 @@ class Directive(DLL):
 
 
 class Include(Directive):
+    __slots__ = ("path",)
+
     def __init__(self, path: str, line: int, filename: str):
         super().__init__(line, filename)
         self.path = path
@@ -301,6 +377,8 @@ class Include(Directive):
 
 
 class Entry(Directive):
+    __slots__ = ("id",)
+
     def __init__(self, id: Id, line: int, filename: str):
         super().__init__(line, filename)
         self.id = id
@@ -310,6 +388,8 @@ class Entry(Directive):
 
 
 class ToplevelQuery(Directive):
+    __slots__ = ("grammar",)
+
     def __init__(self, grammar: Grammar, line: int, filename: str):
         super().__init__(line, filename)
         self.grammar = grammar
@@ -321,6 +401,8 @@ class ToplevelQuery(Directive):
 
 
 class BackendQuery(Directive):
+    __slots__ = ("name", "grammar")
+
     def __init__(self, name: str, grammar: Grammar, line: int, filename: str):
         super().__init__(line, filename)
         self.name = name
@@ -333,6 +415,8 @@ class BackendQuery(Directive):
 
 
 class BackendDef(Directive):
+    __slots__ = ("id", "expr")
+
     def __init__(self, id: Id, expr: str, line: int, filename: str):
         super().__init__(line, filename)
         self.id = id
@@ -346,6 +430,8 @@ class BackendDef(Directive):
 
 
 class Ignore(Directive):
+    __slots__ = ("ids",)
+
     def __init__(self, ids: list[Id], line: int, filename: str):
         super().__init__(line, filename)
         self.ids = ids
@@ -355,6 +441,17 @@ class Ignore(Directive):
 
 
 class Rule(DLL):
+    __slots__ = (
+        "id",
+        "expr",
+        "ignore",
+        "entry",
+        "head",
+        "leftrec",
+        "nullable",
+        "parse_info"
+    )
+
     def __init__(self,
                  id: Id,
                  expr: Expr,
@@ -363,6 +460,7 @@ class Rule(DLL):
                  ignore: bool = False,
                  entry: bool = False):
 
+        super().__init__()
         self.id = id
         self.expr = expr
         self.ignore = ignore
@@ -399,6 +497,8 @@ class Rule(DLL):
 
 
 class LR:
+    __slots__ = ("chains",)
+
     def __init__(self, chains: list[tuple[Id]]):
         self.chains = chains
 
@@ -421,6 +521,8 @@ class LR:
 
 
 class MetaRef:
+    __slots__ = ("name", "parse_info")
+
     def __init__(self, name: Id, parse_info: Optional[ParseInfo] = None):
         self.name = name
         self.parse_info = parse_info
@@ -444,11 +546,14 @@ class MetaRef:
 
 
 class MetaRule(DLL):
+    __slots__ = ("id", "expr", "parse_info")
+
     def __init__(self,
                  id: Optional[Id],
                  expr: str,
                  parse_info: Optional[ParseInfo] = None):
 
+        super().__init__()
         self.id = id
         self.expr = expr
         self.parse_info = parse_info
@@ -474,6 +579,8 @@ class MetaRule(DLL):
 
 
 class Expr:
+    __slots__ = ("alts", "parse_info")
+
     def __init__(self,
                  alts: Iterable[Alt],
                  parse_info: Optional[ParseInfo] = None):
@@ -501,12 +608,15 @@ class Expr:
 
 
 class Alt(DLL):
+    __slots__ = ("items", "metarule", "nullable", "parse_info", "grower")
+
     def __init__(self,
                  items: Iterable[NamedItem],
                  parse_info: Optional[ParseInfo] = None,
                  *,
                  metarule: MetaRef | MetaRule | None = None):
 
+        super().__init__()
         self.items: Optional[NamedItem] = DLL.from_iterable(items)
         self.metarule = metarule
         self.nullable = False
@@ -538,11 +648,25 @@ class Alt(DLL):
 
 
 class Cut:
+    __slots__ = ("auto",)
+
     def __init__(self, auto=False):
         self.auto = auto
 
+    def __repr__(self):
+        return f"Cut(auto={self.auto})"
+
+    def __eq__(self, other):
+        if type(other) is Cut:
+            return self.auto == other.auto
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.auto)
+
 
 class NamedItem(DLL):
+    __slots__ = ("name", "item", "cut", "nullable", "parse_info")
 
     IGNORE = "_"
 
@@ -552,6 +676,7 @@ class NamedItem(DLL):
                  cut: Optional[Cut] = None,
                  parse_info: Optional[ParseInfo] = None):
 
+        super().__init__()
         self.name = name
         self.item = item
         self.cut = cut
@@ -592,6 +717,8 @@ class NamedItem(DLL):
 
 
 class Id:
+    __slots__ = ("value", "parse_info")
+
     def __init__(self, value: str, parse_info: Optional[ParseInfo] = None):
         self.value = value
         self.parse_info = parse_info
@@ -620,6 +747,8 @@ class Id:
 
 
 class String:
+    __slots__ = ("chars", "parse_info")
+
     def __init__(self,
                  chars: Iterable[Char],
                  parse_info: Optional[ParseInfo] = None):
@@ -656,10 +785,13 @@ class String:
 
 
 class Char(DLL):
+    __slots__ = ("code", "parse_info")
+
     def __init__(self,
                  code: int | str,
                  parse_info: Optional[ParseInfo] = None):
 
+        super().__init__()
         if isinstance(code, str):
             code = ord(code)
         self.code = code
@@ -696,6 +828,8 @@ class Char(DLL):
 
 
 class AnyChar:
+    __slots__ = ("parse_info",)
+
     def __init__(self, parse_info: Optional[ParseInfo] = None):
         self.parse_info = parse_info
 
@@ -716,6 +850,8 @@ class AnyChar:
 
 
 class Class:
+    __slots__ = ("ranges", "parse_info")
+
     def __init__(self,
                  ranges: Iterable[Range],
                  parse_info: Optional[ParseInfo] = None):
@@ -735,7 +871,7 @@ class Class:
 
     def __eq__(self, other):
         if isinstance(other, Class):
-            return DLL.astuple(self.ranges) == DLL.astuple(self.ranges)
+            return DLL.astuple(self.ranges) == DLL.astuple(other.ranges)
         return NotImplemented
 
     def __hash__(self):
@@ -743,10 +879,13 @@ class Class:
 
 
 class Range(DLL):
+    __slots__ = ("first", "last", "parse_info")
+
     def __init__(self,
                  first: Char,
                  last: Optional[Char] = None,
                  parse_info: Optional[ParseInfo] = None):
+        super().__init__()
         self.first = first
         self.last = last
         self.parse_info = parse_info
@@ -775,6 +914,8 @@ class Range(DLL):
 
 
 class ZeroOrOne:
+    __slots__ = ("item", "parse_info")
+
     def __init__(self, item: Item, parse_info: Optional[ParseInfo] = None):
         self.item = item
         self.parse_info = parse_info
@@ -798,6 +939,8 @@ class ZeroOrOne:
 
 
 class ZeroOrMore:
+    __slots__ = ("item", "parse_info")
+
     def __init__(self, item: Item, parse_info: Optional[ParseInfo] = None):
         self.item = item
         self.parse_info = parse_info
@@ -821,6 +964,8 @@ class ZeroOrMore:
 
 
 class OneOrMore:
+    __slots__ = ("item", "parse_info")
+
     def __init__(self, item: Item, parse_info: Optional[ParseInfo] = None):
         self.item = item
         self.parse_info = parse_info
@@ -844,6 +989,8 @@ class OneOrMore:
 
 
 class Repetition:
+    __slots__ = ("item", "first", "last", "parse_info")
+
     def __init__(self,
                  item: Item,
                  first: int,
@@ -878,6 +1025,8 @@ class Repetition:
 
 
 class Not:
+    __slots__ = ("item", "parse_info")
+
     def __init__(self, item: Item, parse_info: Optional[ParseInfo] = None):
         self.item = item
         self.parse_info = parse_info
@@ -901,6 +1050,8 @@ class Not:
 
 
 class And:
+    __slots__ = ("item", "parse_info")
+
     def __init__(self, item: Item, parse_info: Optional[ParseInfo] = None):
         self.item = item
         self.parse_info = parse_info
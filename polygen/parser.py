@@ -50,6 +50,8 @@ __all__ = ["Token", "Reader", "Parser"]
 
 
 class Token(str):
+    __slots__ = ("line", "start", "end", "filename")
+
     def __new__(cls,
                 value: str,
                 line: int,
@@ -368,6 +370,7 @@ class Parser:
         self._tokens.clear()
         self._memos.clear()
         self._pos = 0
+        self._pos_offset = 0
 
         result = self._Grammar()
         if result is None:
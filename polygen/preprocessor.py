@@ -1,7 +1,12 @@
+import os
+import copy
+import hashlib
 import logging
 
+from io import StringIO
 from pathlib import Path
-from collections import deque
+from collections import deque, OrderedDict
+from typing import Callable, TextIO
 
 from polygen.parser import Reader, Parser
 from polygen.node import (
@@ -21,6 +26,15 @@ from polygen.utility import reindent
 
 logger = logging.getLogger("polygen.gprep")
 
+# Set `POLYGEN_PARSE_CACHE=1` to reuse parsed grammars of files with the
+# same name and content across `process` calls.
+PARSE_CACHE = os.environ.get("POLYGEN_PARSE_CACHE") == "1"
+
+# Parsed grammars keyed by the digest of the file name and content. The
+# least recently used grammar is evicted when the cache is full.
+PARSE_CACHE_SIZE = 256
+_PARSE_CACHE: OrderedDict[bytes, Grammar] = OrderedDict()
+
 
 class GPreprocessorError(Exception):
     pass
@@ -38,10 +52,14 @@ class UnknownEntry(GPreprocessorError):
     pass
 
 
+Opener = Callable[..., TextIO]
+
+
 def process(grammar_file: Path,
             lookup_dirs: list[Path],
             backend_name: str,
-            generator: CodeGeneratorBase):
+            generator: CodeGeneratorBase,
+            opener: Opener = open):
     toplevel_include = Include(str(grammar_file), 0, "<preprocessor>")
     queue = deque([toplevel_include])
     tree = None
@@ -51,6 +69,8 @@ def process(grammar_file: Path,
 
     file_number = 0
     included = set()
+    # Includes of each processed file
+    include_graph: dict[Include, list[Include]] = {}
     deferred = []
 
     # breakpoint()
@@ -60,27 +80,22 @@ def process(grammar_file: Path,
             # Prevent files that were already included by the another branch
             # from being included more than once.
             continue
-        file = _find_include_path(include, lookup_dirs)
-
-        includes, df, subtree = _process(
-            parser,
-            file,
-            lookup_dirs,
-            backend_name,
-            generator,
-            file_number == 0
-        )
+        file, stream = _open_include(include, lookup_dirs, opener)
+        logger.info("file %s", file)
+
+        with stream:
+            includes, df, subtree = _process(
+                parser,
+                stream,
+                backend_name,
+                generator,
+                file_number == 0
+            )
         deferred.extend(df)
 
         included.add(include)
-        for i in includes:
-            if i == include or i in queue:
-                msg = (
-                    f"circular include: in {i.filename}:\n"
-                    f"line: {i.line}: {i.path}"
-                )
-                raise CircularIncludeError(msg)
-            queue.append(i)
+        include_graph[include] = includes
+        queue.extend(includes)
 
         if not tree:
             tree = subtree
@@ -89,6 +104,10 @@ def process(grammar_file: Path,
 
         file_number += 1
 
+    # Files are included once, so cycles are searched in the whole graph
+    # rather than in the order the files were visited
+    _check_circular_includes(toplevel_include, include_graph, set(), set())
+
     for directive in reversed(deferred):
         # Defer the execution of some directives until the grammar is fully
         # constructed to preserve the order.
@@ -101,16 +120,30 @@ def process(grammar_file: Path,
     return tree
 
 
+def _check_circular_includes(include: Include,
+                             graph: dict[Include, list[Include]],
+                             chain: set[Include],
+                             checked: set[Include]):
+    chain.add(include)
+    for i in graph[include]:
+        if i in chain:
+            msg = (
+                f"circular include: in {i.filename}:\n"
+                f"line: {i.line}: {i.path}"
+            )
+            raise CircularIncludeError(msg)
+        if i not in checked:
+            _check_circular_includes(i, graph, chain, checked)
+    chain.remove(include)
+    checked.add(include)
+
+
 def _process(parser: Parser,
-             grammar_file: Path,
-             lookup_dirs: list[Path],
+             stream: TextIO,
              backend_name: str,
              generator: CodeGeneratorBase,
              toplevel: bool) -> tuple[list[Include], list[Directive], Grammar]:
-    logger.info("file %s", grammar_file)
-
-    with open(grammar_file, 'r', encoding="UTF-8") as fin:
-        tree: Grammar = parser.parse(fin)
+    tree = _parse(parser, stream)
 
     includes, deferred = [], []
 
@@ -156,23 +189,60 @@ def _process(parser: Parser,
     return includes, deferred, tree
 
 
-def _find_include_path(include: Include, lookup_dirs: list[Path]) -> Path:
+def _parse(parser: Parser, stream: TextIO) -> Grammar:
+    if not PARSE_CACHE:
+        return parser.parse(stream)
+
+    # The name is part of the key, because the directives store the
+    # file name they come from.
+    name = getattr(stream, "name", "<stream>")
+    text = stream.read()
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(name.encode("UTF-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("UTF-8"))
+    key = digest.digest()
+
+    if (tree := _PARSE_CACHE.get(key)) is None:
+        source = StringIO(text)
+        source.name = name
+        tree = _PARSE_CACHE[key] = parser.parse(source)
+        if len(_PARSE_CACHE) > PARSE_CACHE_SIZE:
+            _PARSE_CACHE.popitem(last=False)
+    else:
+        _PARSE_CACHE.move_to_end(key)
+
+    # Trees are modified during preprocessing, so the cached tree is copied
+    return copy.deepcopy(tree)
+
+
+def clear_parse_cache():
+    _PARSE_CACHE.clear()
+
+
+def _open_include(include: Include,
+                  lookup_dirs: list[Path],
+                  opener: Opener) -> tuple[Path, TextIO]:
+    """Open the included file.
+
+    The path is tried as is first, then relative to each of the lookup
+    directories. Returns the path of the opened file and the stream.
+    """
     path = Path(include.path)
-    if not path.exists():
-        for dir in lookup_dirs:
-            include_path = dir / path
-            if include_path.exists():
-                logger.info("include found %s", include_path)
-                path = include_path
-                break
-        else:
-            msg = (
-                f"on {include.filename}: line {include.line}:\n"
-                f"include path not found: {include.path!r}"
-            )
-            raise IncludeNotFound(msg)
+    for candidate in (path, *(dir / path for dir in lookup_dirs)):
+        try:
+            stream = opener(candidate, 'r', encoding="UTF-8")
+        except FileNotFoundError:
+            continue
+        if candidate is not path:
+            logger.info("include found %s", candidate)
+        return candidate, stream
 
-    return path
+    msg = (
+        f"on {include.filename}: line {include.line}:\n"
+        f"include path not found: {include.path!r}"
+    )
+    raise IncludeNotFound(msg)
 
 
 def _mark_entry_rule(entry: Entry, tree: Grammar):
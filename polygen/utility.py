@@ -45,7 +45,7 @@ def reindent(string: str,
             If equals to 0, then indentation will be removed.
         indent: Indentation string per one level.
     """
-    lines = [line for line in string.split('\n')]
+    lines = string.split('\n')
     empty_lines: set[int] = set()
     new_indent = indent * level
     base_indent = None
@@ -61,6 +61,10 @@ def reindent(string: str,
         if len(base_indent) > whitespace_len:
             base_indent = ' ' * whitespace_len
 
+    # Nothing to align if all lines are blank
+    if base_indent is None:
+        return string
+
     indent_len = len(base_indent)
     for i, line in enumerate(lines):
         if i not in empty_lines:
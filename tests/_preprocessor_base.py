@@ -0,0 +1,135 @@
+import os
+import functools
+
+from dataclasses import dataclass
+from io import StringIO
+from pathlib import Path
+from typing import Optional
+
+from polygen.preprocessor import process
+from polygen.node import Grammar
+from polygen.generator.base import CodeGeneratorBase
+
+
+# Test files are served from memory. Set `POLYGEN_TEST_DIR` environment
+# variable to an existing directory to write them to disk for inspection,
+# in which case they are read back through the filesystem.
+TEST_NAME = "test_grammar_preprocessor"
+TEST_DIR = os.environ.get("POLYGEN_TEST_DIR")
+if TEST_DIR:
+    TEST_DIR = Path(TEST_DIR) / TEST_NAME
+
+
+def _write(path: Path, content: str):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, content.encode("UTF-8"))
+    finally:
+        os.close(fd)
+
+
+@functools.cache
+def _materialize(files: tuple[tuple[Path, str], ...]):
+    """Write the test files to disk once per unique set of files."""
+    for dir in {filename.parent for filename, _ in files}:
+        dir.mkdir(exist_ok=True, parents=True)
+    for filename, content in files:
+        _write(filename, content)
+
+
+@dataclass(frozen=True)
+class File:
+    name: str
+    content: str
+    dir: str = ""
+    entry: bool = False
+
+
+class MockCodeGen(CodeGeneratorBase):
+    NAME = "mock"
+    LANGUAGE = "Mock"
+    VERSION = "0.0.0"
+    FILES = []
+    OPTIONS = {}
+
+    def generate(self, grammar, options):
+        pass
+
+
+class PreprocessorTestBase:
+
+    input_files: tuple[File, ...]
+    exception: Optional[type] = None
+
+    @staticmethod
+    def grammar() -> Optional[Grammar]:
+        """Build the expected grammar.
+
+        Called only when the test runs, so that the tree is not built
+        for tests that are not selected.
+        """
+        return None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.gen = MockCodeGen()
+
+    def setUp(self):
+        self.gen.cleanup()
+
+        if TEST_DIR:
+            base_dir = TEST_DIR / type(self).__name__
+        else:
+            base_dir = Path(TEST_NAME) / type(self).__name__
+
+        self.entry = None
+        self.base_dir = base_dir
+        self.files: dict[Path, str] = {}
+        for file in self.input_files:
+            filename = base_dir / file.dir / file.name
+
+            if file.entry:
+                assert not self.entry, "only one entry can be specified"
+                self.entry = filename
+
+            self.files[filename] = file.content
+
+        if not self.entry:
+            self.fail("specify one entry")
+
+        if TEST_DIR:
+            _materialize(tuple(self.files.items()))
+
+    def open(self, path: Path, *args, **kwargs) -> StringIO:
+        """Open a test file from memory."""
+        try:
+            stream = StringIO(self.files[Path(path)])
+        except KeyError:
+            raise FileNotFoundError(path) from None
+        stream.name = str(path)
+        return stream
+
+    def run_process(self) -> Grammar:
+        return process(
+            self.entry,
+            [self.base_dir],
+            backend_name=MockCodeGen.NAME,
+            generator=self.gen,
+            opener=open if TEST_DIR else self.open
+        )
+
+    def test_process(self):
+        if self.exception:
+            with self.assertRaises(self.exception):
+                self.run_process()
+            return
+
+        tree = self.run_process()
+
+        inspect = getattr(self, "inspect", None)
+        if inspect:
+            inspect(tree, self.gen)
+
+        if (grammar := self.grammar()) is not None:
+            self.assertEqual(tree, grammar)
@@ -1,19 +1,22 @@
-import os
+import sys
 import unittest
+import functools
 
-from dataclasses import dataclass
-from tempfile import TemporaryDirectory
-from pathlib import Path
-from typing import Optional
+from io import StringIO
+from unittest.mock import patch
+
+import polygen.preprocessor
+
+from polygen.parser import Parser, Reader
 
 from polygen.preprocessor import (
-    process,
     IncludeNotFound,
     CircularIncludeError,
     UnknownEntry
 )
 from polygen.node import (
     RuleNotFound,
+    DLL,
     Grammar,
     Rule,
     Expr,
@@ -22,93 +25,29 @@ from polygen.node import (
     Id,
     Char
 )
-from polygen.generator.base import CodeGeneratorBase
-
-
-TEST_NAME = "test_grammar_preprocessor"
-TEST_DIR = os.environ.get("POLYGEN_TEST_DIR")
-if TEST_DIR:
-    TEST_DIR = Path(TEST_DIR) / TEST_NAME
-else:
-    TMP_DIR = TemporaryDirectory()
-    TEST_DIR = Path(TMP_DIR.name) / TEST_NAME
-
-
-@dataclass
-class File:
-    name: str
-    content: str
-    dir: str = ""
-    entry: bool = False
-
-
-class MockCodeGen(CodeGeneratorBase):
-    NAME = "mock"
-    LANGUAGE = "Mock"
-    VERSION = "0.0.0"
-    FILES = []
-    OPTIONS = {}
-
-    def generate(self, grammar, options):
-        pass
-
-
-class PreprocessorTestBase:
-
-    input_files: list[File]
-    grammar: Optional[Grammar] = None
-    exception: Optional[type] = None
-
-    def setUp(self):
-        base_dir = TEST_DIR / type(self).__name__
-        base_dir.mkdir(exist_ok=True, parents=True)
-
-        self.entry = None
-        self.base_dir = base_dir
-        for file in self.input_files:
-            file_dir = base_dir / file.dir
-            filename = file_dir / file.name
-
-            if file.entry:
-                assert not self.entry, "only one entry can be specified"
-                self.entry = filename
 
-            file_dir.mkdir(exist_ok=True, parents=True)
-            filename.write_text(file.content)
+from _preprocessor_base import File, MockCodeGen, PreprocessorTestBase
 
-        if not self.entry:
-            self.fail("specify one entry")
 
-    def test_process(self):
-        gen = MockCodeGen()
-
-        try:
-            tree = process(
-                self.entry,
-                [self.base_dir],
-                backend_name=MockCodeGen.NAME,
-                generator=gen
-            )
-        except Exception as e:
-            if self.exception:
-                self.assertIsInstance(e, self.exception)
-                return
-
-            raise
-
-        inspect = getattr(self, "inspect", None)
-        if inspect:
-            inspect(tree, gen)
-
-        if self.grammar:
-            self.assertEqual(tree, self.grammar)
+TestBase = PreprocessorTestBase
 
 
-TestBase = PreprocessorTestBase
+# Expected trees are only compared, so tests with the same expected
+# grammar share one instance.
+@functools.cache
+def include_grammar() -> Grammar:
+    return Grammar([
+        Rule(Id('Grammar'), Expr([
+            Alt([NamedItem(None, Id('Rule'))])
+        ]), entry=True),
+        Rule(Id('Rule'), Expr([
+            Alt([NamedItem(None, Char('a'))])
+        ])),
+    ])
 
 
 class TestIncludeFile(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File("grammar.peg", """
 @include "include.peg"
 
@@ -117,21 +56,14 @@ Grammar <- Rule
 """, entry=True),
         File("include.peg", """
 Rule <- 'a'
-""")
-    ]
+"""),
+    )
 
-    grammar = Grammar([
-        Rule(Id('Grammar'), Expr([
-            Alt([NamedItem(None, Id('Rule'))])
-        ]), entry=True),
-        Rule(Id('Rule'), Expr([
-            Alt([NamedItem(None, Char('a'))])
-        ])),
-    ])
+    grammar = staticmethod(include_grammar)
 
 
 class TestIncludeSubdirectory(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File("grammar.peg", """
 @include "subdir/include.peg"
 
@@ -140,28 +72,17 @@ Grammar <- Rule
 """, entry=True),
         File("include.peg", """
 Rule <- 'a'
-""", dir="subdir")
-    ]
+""", dir="subdir"),
+    )
 
-    grammar = Grammar([
-        Rule(Id('Grammar'), Expr([
-            Alt([NamedItem(None, Id('Rule'))])
-        ]), entry=True),
-        Rule(Id('Rule'), Expr([
-            Alt([NamedItem(None, Char('a'))])
-        ])),
-    ])
+    grammar = staticmethod(include_grammar)
 
     def inspect(self, grammar: Grammar, gen):
-        for r in grammar.rules.iter():
-            if r.id.value == "Grammar":
-                self.assertTrue(r.entry)
-                return
-        self.fail("Grammar rule not found")
+        self.assertTrue(grammar.get_rule("Grammar").entry)
 
 
 class TestNestedInclude(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File("grammar.peg", """
 @include "include1.peg"
 
@@ -176,30 +97,41 @@ Grammar <- Rule
 """),
         File("include3.peg", """
 Rule <- 'a'
-""")
-    ]
+"""),
+    )
 
-    grammar = Grammar([
-        Rule(Id('Grammar'), Expr([
-            Alt([NamedItem(None, Id('Rule'))])
-        ]), entry=True),
-        Rule(Id('Rule'), Expr([
-            Alt([NamedItem(None, Char('a'))])
-        ])),
-    ])
+    grammar = staticmethod(include_grammar)
 
     def inspect(self, grammar: Grammar, gen):
-        for r in grammar.rules.iter():
-            if r.id.value == "Grammar":
-                self.assertTrue(r.entry)
-                return
-        self.fail("Grammar rule not found")
+        self.assertTrue(grammar.get_rule("Grammar").entry)
 
 
 class TestCircularInclude(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
+        File("grammar.peg", """
+@include "include1.peg"
+
+@entry
+Grammar <- Rule
+""", entry=True),
+        File("include1.peg", """
+@include "include2.peg"
+"""),
+        File("include2.peg", """
+@include "include1.peg"
+"""),
+    )
+
+    exception = CircularIncludeError
+
+
+class TestDiamondInclude(TestBase, unittest.TestCase):
+    """Files included by several files are not a circular include."""
+
+    input_files = (
         File("grammar.peg", """
 @include "include1.peg"
+@include "include2.peg"
 
 @entry
 Grammar <- Rule
@@ -208,62 +140,80 @@ Grammar <- Rule
 @include "include2.peg"
 """),
         File("include2.peg", """
+Rule <- 'a'
+"""),
+    )
+
+    grammar = staticmethod(include_grammar)
+
+
+class TestCircularIncludeAfterDiamond(TestBase, unittest.TestCase):
+    """A cycle is found even if its files were included by another branch."""
+
+    input_files = (
+        File("grammar.peg", """
 @include "include1.peg"
-""")
-    ]
+@include "include2.peg"
+
+@entry
+Grammar <- Rule
+""", entry=True),
+        File("include1.peg", """
+@include "include2.peg"
+"""),
+        File("include2.peg", """
+@include "include1.peg"
+"""),
+    )
 
     exception = CircularIncludeError
 
 
 class TestParserFailed(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File("grammar.peg", """
 @entry
 Grammar <- <- Rule
-""", entry=True)
-    ]
+""", entry=True),
+    )
 
     exception = SyntaxError
 
 
 class TestIncludeNotFound(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File("grammar.peg", """
 @include "include1.peg"
 
 @entry
 Grammar <- Rule
-""", entry=True)
-    ]
+""", entry=True),
+    )
 
     exception = IncludeNotFound
 
 
 class TestEntryDirective(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File("grammar.peg", """
              @entry Grammar
 
              Grammar <- Rule
-             """, entry=True)
-    ]
+             """, entry=True),
+    )
 
     def inspect(self, grammar: Grammar, gen):
-        for r in grammar.rules.iter():
-            if r.id.value == "Grammar":
-                self.assertTrue(r.entry)
-                return
-        self.fail("Grammar rule not found")
+        self.assertTrue(grammar.get_rule("Grammar").entry)
 
 
 class TestEntryNotFound(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File("grammar.peg", """
              @entry Foo
 
              Grammar <- Rule
-             """, entry=True)
-    ]
+             """, entry=True),
+    )
 
     exception = UnknownEntry
 
@@ -274,7 +224,7 @@ class TestEntryInAnotherFile(TestBase, unittest.TestCase):
     merged grammar.
     """
 
-    input_files = [
+    input_files = (
         File(
             "file1.peg",
             """
@@ -290,19 +240,15 @@ class TestEntryInAnotherFile(TestBase, unittest.TestCase):
             """
             Grammar <- Rule
             """
-        )
-    ]
+        ),
+    )
 
     def inspect(self, grammar: Grammar, gen):
-        for r in grammar.rules.iter():
-            if r.id.value == "Grammar":
-                self.assertTrue(r.entry)
-                return
-        self.fail("Grammar rule not found")
+        self.assertTrue(grammar.get_rule("Grammar").entry)
 
 
 class TestIgnoreDirective(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File(
             "grammar.peg",
             """
@@ -316,8 +262,8 @@ class TestIgnoreDirective(TestBase, unittest.TestCase):
             Baz <-
             """,
             entry=True
-        )
-    ]
+        ),
+    )
 
     def inspect(self, grammar: Grammar, gen):
         self.assertTrue(grammar.get_rule("Foo").ignore)
@@ -326,7 +272,7 @@ class TestIgnoreDirective(TestBase, unittest.TestCase):
 
 
 class TestToplevelDirective(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File(
             "file1.peg",
             """
@@ -340,8 +286,8 @@ class TestToplevelDirective(TestBase, unittest.TestCase):
             }
             """,
             entry=True
-        )
-    ]
+        ),
+    )
 
     def inspect(self, grammar: Grammar, gen):
         self.assertTrue(grammar.get_rule("Foo").entry)
@@ -352,7 +298,7 @@ class TestToplevelDirective(TestBase, unittest.TestCase):
 
 
 class TestToplevelNested(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File(
             "file1.peg",
             """
@@ -375,8 +321,8 @@ class TestToplevelNested(TestBase, unittest.TestCase):
             Rule <-
             """,
             entry=True
-        )
-    ]
+        ),
+    )
 
     def inspect(self, grammar: Grammar, gen):
         self.assertRaises(RuleNotFound, grammar.get_rule, "Baz")
@@ -385,15 +331,15 @@ class TestToplevelNested(TestBase, unittest.TestCase):
 
 
 class TestBackendDef(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File(
             "file.peg",
             """
             @backend.header {hello world}
             """,
             entry=True
-        )
-    ]
+        ),
+    )
 
     def inspect(self, grammar, gen: MockCodeGen):
         self.assertIn("header", gen._directives)
@@ -401,7 +347,7 @@ class TestBackendDef(TestBase, unittest.TestCase):
 
 
 class TestBackendDefAppend(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File(
             "file.peg",
             """
@@ -410,8 +356,8 @@ class TestBackendDefAppend(TestBase, unittest.TestCase):
             @backend.header {hello world}
             """,
             entry=True
-        )
-    ]
+        ),
+    )
 
     def inspect(self, grammar, gen: MockCodeGen):
         self.assertIn("header", gen._directives)
@@ -424,7 +370,7 @@ class TestBackendDefAppend(TestBase, unittest.TestCase):
 class TestBackendDefIncludeAppend(TestBase, unittest.TestCase):
     """`file2` processed before `@backend` directive in `file1`."""
 
-    input_files = [
+    input_files = (
         File(
             "file1.peg",
             """
@@ -439,7 +385,7 @@ class TestBackendDefIncludeAppend(TestBase, unittest.TestCase):
             @backend.header {b}
             """
         ),
-    ]
+    )
 
     def inspect(self, grammar, gen: MockCodeGen):
         self.assertIn("header", gen._directives)
@@ -453,7 +399,7 @@ class TestBackendDefAppendInclude(TestBase, unittest.TestCase):
     First `file1`'s `@backend.header` contents inserted, then `file2`'s.
     """
 
-    input_files = [
+    input_files = (
         File(
             "file1.peg",
             """
@@ -468,7 +414,7 @@ class TestBackendDefAppendInclude(TestBase, unittest.TestCase):
             @backend.header {b}
             """
         ),
-    ]
+    )
 
     def inspect(self, grammar, gen: MockCodeGen):
         self.assertIn("header", gen._directives)
@@ -476,7 +422,7 @@ class TestBackendDefAppendInclude(TestBase, unittest.TestCase):
 
 
 class TestBackendQuery(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File(
             "grammar.peg",
             """
@@ -496,8 +442,8 @@ class TestBackendQuery(TestBase, unittest.TestCase):
             }
             """,
             entry=True
-        )
-    ]
+        ),
+    )
 
     def inspect(self, grammar: Grammar, gen):
         self.assertTrue(grammar.get_rule("Foo").entry)
@@ -510,7 +456,7 @@ class TestBackendQuery(TestBase, unittest.TestCase):
 
 
 class TestNestedQueries(TestBase, unittest.TestCase):
-    input_files = [
+    input_files = (
         File(
             "grammar.peg",
             """
@@ -540,13 +486,95 @@ class TestNestedQueries(TestBase, unittest.TestCase):
             }
             """,
             entry=True
-        )
-    ]
-
-    grammar = Grammar([
-        Rule(Id("Foo"), Expr([Alt([])])),
-        Rule(Id("Bar"), Expr([Alt([])])),
-        Rule(Id("Faz"), Expr([Alt([])])),
-        Rule(Id("Baz"), Expr([Alt([])])),
-        Rule(Id("Far"), Expr([Alt([])])),
-    ], [])
+        ),
+    )
+
+    @staticmethod
+    def grammar():
+        return Grammar([
+            Rule(Id("Foo"), Expr([Alt([])])),
+            Rule(Id("Bar"), Expr([Alt([])])),
+            Rule(Id("Faz"), Expr([Alt([])])),
+            Rule(Id("Baz"), Expr([Alt([])])),
+            Rule(Id("Far"), Expr([Alt([])])),
+        ], [])
+
+
+class TestParseCache(TestBase, unittest.TestCase):
+    input_files = (
+        File(
+            "grammar.peg",
+            """
+            @entry Grammar
+
+            Grammar <- 'a'
+            """,
+            entry=True
+        ),
+    )
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch.object(polygen.preprocessor, "PARSE_CACHE", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        polygen.preprocessor.clear_parse_cache()
+        self.addCleanup(polygen.preprocessor.clear_parse_cache)
+
+    def inspect(self, grammar: Grammar, gen):
+        self.assertTrue(grammar.get_rule("Grammar").entry)
+
+    def test_cached_tree_is_copied(self):
+        with patch.object(Parser, "parse", autospec=True,
+                          side_effect=Parser.parse) as parse:
+            first, second = self.run_process(), self.run_process()
+
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(len(polygen.preprocessor._PARSE_CACHE), 1)
+        self.assertIsNot(first, second)
+        self.assertEqual(first, second)
+        self.assertTrue(second.get_rule("Grammar").entry)
+
+    def parse(self, text: str) -> Grammar:
+        stream = StringIO(text)
+        stream.name = "grammar.peg"
+        return polygen.preprocessor._parse(self.parser, stream)
+
+    def test_cache_is_bounded(self):
+        # The first grammar is longer than the recursion limit, so that
+        # the copies made on cache hits are checked on a real-sized tree
+        length = sys.getrecursionlimit() + 100
+        long_text = "\n".join(f"A{i} <- 'a'" for i in range(length))
+
+        self.parser = Parser(Reader(None))
+        with patch.object(polygen.preprocessor, "PARSE_CACHE_SIZE", 2):
+            first = self.parse(long_text)
+            self.parse("B <- 'b'")
+            # Using the first grammar makes the second the oldest one
+            self.assertEqual(self.parse(long_text), first)
+            self.parse("C <- 'c'")
+
+        cache = polygen.preprocessor._PARSE_CACHE
+        self.assertEqual(len(cache), 2)
+        self.assertEqual([str(tree.rules.id) for tree in cache.values()],
+                         ["A0", "C"])
+
+    def test_long_lists_are_copied(self):
+        # Lists longer than the recursion limit must not be copied
+        # recursively
+        length = sys.getrecursionlimit() + 100
+        rules = "\n".join(f"R{i} <- 'b'" for i in range(length))
+        text = f"A <- '{'a' * length}'\n{rules}\n"
+
+        self.parser = Parser(Reader(None))
+        first, second = self.parse(text), self.parse(text)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(first, second)
+        rules = DLL.astuple(second.rules)
+        self.assertEqual(len(rules), length + 1)
+        for left, right in zip(rules, rules[1:]):
+            self.assertIs(left.right, right)
+            self.assertIs(right.left, left)
+        string = rules[0].expr.alts.items.item
+        self.assertEqual(len(DLL.astuple(string.chars)), length)
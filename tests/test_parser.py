@@ -1,5 +1,4 @@
 import unittest
-import inspect
 
 from polygen.parser import Reader, Parser
 from polygen.node import (
@@ -32,33 +31,24 @@ class ParserTestMetaclass(type):
         if name == 'ParserTest':
             return
 
-        lineno = inspect.getsourcelines(cls)[1]
         node_extractor = getattr(cls, 'node_extractor', lambda obj: obj)
 
         def test_successes(self):
+            # Parser.parse resets the reader and the parser state
+            parser = Parser(Reader(None))
             for input, clue in self.successes:
-                reader = Reader(None)
-                parser = Parser(reader)
-                result = parser.parse(input)
+                with self.subTest(input=input):
+                    result = parser.parse(input)
 
-                try:
                     self.assertIsNotNone(result)
-                    value = node_extractor(result)
-                    self.assertEqual(value, clue)
-                except AssertionError as e:
-                    msg = f"{lineno}: tnput string: {input!r}; what: {e}"
-                    raise AssertionError(msg)
+                    self.assertEqual(node_extractor(result), clue)
 
         def test_failures(self):
-            self: unittest.TestCase
+            parser = Parser(Reader(None))
             for input in self.failures:
-                reader = Reader(None)
-                parser = Parser(reader)
-                try:
-                    parser.parse(input)
-                except SyntaxError:
-                    return
-                self.fail("SyntaxError not raised")
+                with self.subTest(input=input):
+                    with self.assertRaises(SyntaxError):
+                        parser.parse(input)
 
         if getattr(cls, 'successes', None):
             setattr(cls, 'test_successes', test_successes)
@@ -182,6 +172,19 @@ class TestRuleDirectives(unittest.TestCase):
         self.assertTrue(result.rules.begin.ignore)
 
 
+class TestParserReuse(unittest.TestCase):
+    def test_parse_after_cut(self):
+        parser = Parser(Reader(None))
+
+        # Unterminated string literal fails after the cut
+        with self.assertRaises(SyntaxError):
+            parser.parse("A <- 'a")
+
+        result = parser.parse("A <- B")
+        self.assertEqual(result, Grammar([
+            Rule(Id('A'), Expr([Alt([NamedItem(None, Id('B'))])]))]))
+
+
 class TestMetaRule(ParserTest):
     def test_1(self):
         parser = Parser(Reader(None))
@@ -269,13 +272,13 @@ class TestAnyChar(ParserTest):
 
     @staticmethod
     def node_extractor(gram: Grammar):
-        return list(DLL.astuple(gram.rules.begin.expr.alts.begin.items))
+        return DLL.astuple(gram.rules.begin.expr.alts.begin.items)
 
     successes = [
-        ("Id <- .", [NamedItem(None, AnyChar())]),
-        ("Id <- ...", [NamedItem(None, AnyChar()),
+        ("Id <- .", (NamedItem(None, AnyChar()),)),
+        ("Id <- ...", (NamedItem(None, AnyChar()),
                        NamedItem(None, AnyChar()),
-                       NamedItem(None, AnyChar())])
+                       NamedItem(None, AnyChar())))
     ]
 
 
@@ -384,3 +387,15 @@ class TestClass(ParserTest):
                                 Range(Char('a'), Char('z')),
                                 Range(Char('-'))]))
     ]
+
+
+class TestClassEquality(unittest.TestCase):
+
+    def test_ranges_are_compared(self):
+        self.assertEqual(Class([Range(Char('a'), Char('c'))]),
+                         Class([Range(Char('a'), Char('c'))]))
+        self.assertNotEqual(Class([Range(Char('a'))]),
+                            Class([Range(Char('b'))]))
+        self.assertNotEqual(Class([Range(Char('a'), Char('c'))]),
+                            Class([Range(Char('a'))]))
+        self.assertNotEqual(Class([Range(Char('a'))]), Class([]))
@@ -1,9 +1,12 @@
+import os
+import shutil
 import unittest
 
 from io import StringIO
 from tempfile import TemporaryDirectory
 from pathlib import Path
 from contextlib import contextmanager
+from typing import Optional
 
 from polygen.generator.preprocessor import (
     create_output_filename,
@@ -18,7 +21,6 @@ from polygen.generator.preprocessor import (
     check_undefined_directives_batch
 )
 
-TMP_DIR = TemporaryDirectory()
 TEST_DIR = Path.cwd() / 'tests' / 'preprocessor_tests'
 
 
@@ -168,38 +170,42 @@ class FileSystemManager:
             return
 
         if files == "*":
-            paths = []
-            for f in source.iterdir():
-                if not f.is_file():
-                    continue
-                dest = self.root / f.name
-                dest.touch()
-                dest.write_bytes(f.read_bytes())
-                paths.append(dest)
-            return paths
+            with os.scandir(source) as entries:
+                return [self._copy(Path(entry.path))
+                        for entry in entries if entry.is_file()]
 
         if isinstance(files, list):
             paths = []
             for f in map(source.joinpath, files):
                 if not f.is_file():
                     continue
-                dest = self.root / f.name
-                dest.touch()
-                dest.write_bytes(f.read_bytes())
-                paths.append(dest)
+                paths.append(self._copy(f))
             return paths
 
         else:
             f = source / files
             if not f.is_file():
                 return
-            dest = self.root / f.name
-            dest.touch()
-            dest.write_bytes(f.read_bytes())
-            return dest
+            return self._copy(f)
+
+    def _copy(self, file: Path) -> Path:
+        dest = self.root / file.name
+        shutil.copyfile(file, dest)
+        return dest
+
+
+tmp_dir: Optional[TemporaryDirectory] = None
+fs: Optional[FileSystemManager] = None
+
+
+def setUpModule():
+    global tmp_dir, fs
+    tmp_dir = TemporaryDirectory()
+    fs = FileSystemManager(tmp_dir.name)
 
 
-fs = FileSystemManager(TMP_DIR.name)
+def tearDownModule():
+    tmp_dir.cleanup()
 
 
 class Test_check_undefined_file(unittest.TestCase):
@@ -253,5 +259,5 @@ class Test_check_undefined_batch(unittest.TestCase):
 
             self.assertEqual(len(undef), 3)
 
-            for input_file, directive in zip(files, undef):
-                self.assertEqual(str(input_file), directive.filename)
+            self.assertEqual([str(input_file) for input_file in files],
+                             [directive.filename for directive in undef])
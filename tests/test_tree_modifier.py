@@ -1,6 +1,6 @@
 import unittest
 
-from typing import Optional
+from typing import Optional, Callable
 
 from polygen.node import (
     Grammar,
@@ -40,65 +40,58 @@ from polygen.modifier import (
 )
 
 
-class TreeModifierTestMeta(type):
+def _test_failure(self: unittest.TestCase):
+    vis = TreeModifier([self.modifier])
 
-    def __init__(cls, name, bases, body):
-        if name == "ModifierTest":
-            return
+    with self.assertRaises(Exception) as context:
+        vis.apply(self.input_data)
 
-        modifier = cls.modifier
-        input_data = cls.input_data
-        clue = getattr(cls, 'clue', None)
-        error = getattr(cls, 'error', None)
-        warnings = getattr(cls, 'warnings', [])
-        validate = getattr(cls, 'validate', None)
+    exc = context.exception
+    self.assertEqual(exc.args, self.error.args)
 
-        if error is not None:
-            def test_raises(self: unittest.TestCase):
-                vis = TreeModifier([modifier])
+    if self.validate:
+        self.validate()
 
-                with self.assertRaises(Exception) as context:
-                    vis.apply(input_data)
 
-                exc = context.exception
-                self.assertEqual(exc.args, error.args)
+def _test_success(self: unittest.TestCase):
+    vis = TreeModifier([self.modifier])
 
-                if validate:
-                    validate(self)
+    if self.warnings:
+        with self.assertRaises(TreeModifierWarning) as context:
+            vis.apply(self.input_data)
 
-            setattr(cls, 'test_failure', test_raises)
+        warn = context.exception
+        warns = warn.args
+        for result_warn, clue_warn in zip(warns, self.warnings):
+            self.assertEqual(result_warn, clue_warn)
 
-        else:
-            def test_success(self: unittest.TestCase):
-                vis = TreeModifier([modifier])
-
-                if warnings:
-                    with self.assertRaises(TreeModifierWarning) as context:
-                        vis.apply(input_data)
-
-                    warn = context.exception
-                    warns = warn.args
-                    for result_warn, clue_warn in zip(warns, warnings):
-                        self.assertEqual(result_warn, clue_warn)
-
-                else:
-                    vis.apply(input_data)
+    else:
+        vis.apply(self.input_data)
 
-                if clue:
-                    self.assertEqual(input_data, clue)
+    if self.clue:
+        self.assertEqual(self.input_data, self.clue)
 
-                if validate:
-                    validate(self)
+    if self.validate:
+        self.validate()
 
-            setattr(cls, 'test_success', test_success)
 
-
-class ModifierTest(unittest.TestCase, metaclass=TreeModifierTestMeta):
+class ModifierTest(unittest.TestCase):
     modifier: object
     input_data: Grammar
-    clue: Optional[Grammar]
-    error: Optional[Exception]
-    warnings: Optional[list[Warning]]
+    clue: Optional[Grammar] = None
+    error: Optional[Exception] = None
+    warnings: Optional[list[Warning]] = None
+    validate: Optional[Callable[[unittest.TestCase], None]] = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        # All test classes share the same test functions, which read
+        # the test data from the class attributes
+        if cls.error is not None:
+            cls.test_failure = _test_failure
+        else:
+            cls.test_success = _test_success
 
 
 class Test_CheckUndefinedRules_Success(ModifierTest):
@@ -228,6 +221,62 @@ class Test_CreateAnyChar_strict(ModifierTest):
     ])
 
 
+class Test_CreateAnyChar_strict_gaps(ModifierTest):
+    modifier = CreateAnyChar(Options(), strict=True)
+
+    input_data = Grammar([
+        Rule(Id('A'), Expr([Alt([NamedItem(None, AnyChar())])])),
+        Rule(Id('B'), Expr([
+            Alt([NamedItem(
+                None,
+                String([Char('z'), Char('a'), Char('x'), Char('b')]))])]))
+    ])
+
+    clue = Grammar([
+        Rule(Id('A'), Expr([Alt([NamedItem(None, Id('AnyChar__GEN'))])])),
+        Rule(Id('B'), Expr([
+            Alt([NamedItem(
+                None,
+                String([Char('z'), Char('a'), Char('x'), Char('b')]))])])),
+        Rule(Id('AnyChar__GEN'), Expr([
+            Alt([NamedItem(
+                None,
+                Class([
+                    Range(Char('a'), Char('b')),
+                    Range(Char('x')),
+                    Range(Char('z'))
+                ]))])]))
+    ])
+
+
+class CollectRuleIds:
+    """Records visited `Id` nodes; does not descend into rules."""
+
+    skip_types = (Rule,)
+
+    def __init__(self):
+        self.ids: list[Id] = []
+        self.done = False
+
+    def visit_Id(self, node: Id, parents):
+        self.ids.append(node)
+
+    def apply(self):
+        self.done = True
+
+
+class Test_Visitor_skip_types(ModifierTest):
+    modifier = CollectRuleIds()
+
+    input_data = Grammar([
+        Rule(Id('A'), Expr([Alt([NamedItem(None, Id('B'))])])),
+        Rule(Id('B'), Expr([Alt([NamedItem(None, AnyChar())])]))
+    ])
+
+    def validate(self):
+        self.assertEqual(self.modifier.ids, [])
+
+
 class Test_ComputeLR_direct(ModifierTest):
 
     rule = Rule(Id('A'), Expr([Alt([NamedItem(None, Id('A'))])]))
@@ -302,6 +351,34 @@ class Test_ComputeLR_direct_nullable_swap_rules(ModifierTest):
         self.assertTrue(self.rule.leftrec)
 
 
+class Test_ComputeLR_indirect_nullable_chain(ModifierTest):
+
+    # B <- A B
+    # A <- C
+    # C <- D
+    # D <- '-'?
+
+    rule = Rule(
+        Id('B'), Expr([Alt([NamedItem(None, Id('A')),
+                            NamedItem(None, Id('B'))])]))
+    tree = Grammar([
+        rule,
+        Rule(Id('A'), Expr([Alt([NamedItem(None, Id('C'))])])),
+        Rule(Id('C'), Expr([Alt([NamedItem(None, Id('D'))])])),
+        Rule(Id('D'), Expr([Alt([NamedItem(None, ZeroOrOne(Char('-')))])]))
+    ])
+    tree.entry = rule
+
+    input_data = tree
+
+    modifier = ComputeLR(Options())
+
+    def validate(self):
+        for name in ('A', 'C', 'D'):
+            self.assertTrue(self.tree.get_rule(name).nullable)
+        self.assertTrue(self.rule.leftrec)
+
+
 class Test_IgnoreRules(ModifierTest):
 
     # @ ignore { A }
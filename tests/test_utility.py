@@ -111,3 +111,7 @@ world
     second line
 """
         self.assertEqual(reindent(s, level=1), clue)
+
+    def test_blank(self):
+        for s in ("", "\n", "  \n    \n"):
+            self.assertEqual(reindent(s, level=2), s)